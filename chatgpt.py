@@ -1,6 +1,7 @@
 import requests
 import re
 import csv
+from operator import itemgetter
 from datetime import datetime, timedelta, timezone
 
 # -----------------------
@@ -12,6 +13,9 @@ START_HOUR = 3   # 03:00 local Canary time
 END_HOUR = 11    # 11:00 local Canary time
 OUTPUT_CSV = "gcgm_wind_03_11_last7days.csv"
 
+ICAO_B = ICAO.encode()
+MIN_LINE_LEN = 20  # "GCGM DDHHMMZ dddffKT" - anything shorter can't match
+
 # -----------------------
 # DATE RANGE (UTC = Canary)
 # -----------------------
@@ -30,60 +34,66 @@ url = (
     "&fmt=txt"
 )
 
-# -----------------------
-# DOWNLOAD METARS
-# -----------------------
-resp = requests.get(url, timeout=30)
-resp.raise_for_status()
-lines = resp.text.splitlines()
-
 # -----------------------
 # REGEXES
 # -----------------------
-time_re = re.compile(r"(\d{6}Z)")           # DDHHMMZ
-wind_re = re.compile(
-    r"(VRB|\d{3})(\d{2})(G(\d{2}))?KT"
+# DDHHMMZ time token followed by the dddff[Ggg]KT wind group
+# (bytes pattern: the response is parsed without decoding it)
+LINE_RE = re.compile(
+    rb"(\d{6}Z)\b.*?\b(VRB|\d{3})(\d{2})(?:G(\d{2}))?KT"
 )
 
+# -----------------------
+# DOWNLOAD + PARSE METARS
+# -----------------------
+# Stream the response so each line is parsed as it arrives
 rows = []
 
-for line in lines:
-    if ICAO not in line:
-        continue
-
-    t_match = time_re.search(line)
-    w_match = wind_re.search(line)
-
-    if not t_match or not w_match:
-        continue
-
-    # Parse time (UTC = Canary)
-    obs_time = datetime.strptime(
-        t_match.group(1), "%d%H%MZ"
-    ).replace(
-        year=end_dt.year,
-        tzinfo=timezone.utc
-    )
-
-    # Fix month/year rollover if needed
-    if obs_time > end_dt:
-        obs_time = obs_time.replace(year=end_dt.year - 1)
-
-    hour = obs_time.hour
-    if not (START_HOUR <= hour <= END_HOUR):
-        continue
-
-    direction = w_match.group(1)
-    sustained = int(w_match.group(2))
-    gust = int(w_match.group(4)) if w_match.group(4) else None
-
-    rows.append([
-        obs_time.strftime("%Y-%m-%d"),
-        obs_time.strftime("%H:%M"),
-        direction,
-        sustained,
-        gust
-    ])
+with requests.get(url, stream=True, timeout=30) as resp:
+    resp.raise_for_status()
+
+    for line in resp.iter_lines():
+        if len(line) < MIN_LINE_LEN or ICAO_B not in line:
+            continue
+
+        match = LINE_RE.search(line)
+        if not match:
+            continue
+
+        # Parse time (UTC = Canary) straight from the DDHHMMZ token
+        tok = match.group(1)
+        day = int(tok[0:2])
+        hh = int(tok[2:4])
+        mm = int(tok[4:6])
+
+        # Fix month/year rollover if needed
+        year, month = end_dt.year, end_dt.month
+        if day > end_dt.day:
+            if month > 1:
+                month -= 1
+            else:
+                year, month = year - 1, 12
+
+        try:
+            obs_time = datetime(year, month, day, hh, mm, tzinfo=timezone.utc)
+        except ValueError:
+            continue
+
+        hour = obs_time.hour
+        if not (START_HOUR <= hour <= END_HOUR):
+            continue
+
+        direction = match.group(2).decode()
+        sustained = int(match.group(3))
+        gust = int(match.group(4)) if match.group(4) else None
+
+        rows.append((
+            obs_time.strftime("%Y-%m-%d"),
+            obs_time.strftime("%H:%M"),
+            direction,
+            sustained,
+            gust
+        ))
 
 # -----------------------
 # WRITE CSV
@@ -97,7 +107,8 @@ with open(OUTPUT_CSV, "w", newline="") as f:
         "wind_speed_kt",
         "wind_gust_kt"
     ])
-    writer.writerows(sorted(rows))
+    rows.sort(key=itemgetter(0, 1))  # by (date, time), in place
+    writer.writerows(rows)
 
 print(f"Saved {len(rows)} rows to {OUTPUT_CSV}")
 
@@ -6,6 +6,7 @@ Export METAR data from SQLite database to various formats
 import sqlite3
 import csv
 import json
+import orjson
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -14,12 +15,41 @@ from pathlib import Path
 DB_PATH = 'metar_data.db'
 STATION = 'GCGM'
 
+_conn = None
+
+
+def get_conn():
+    """Return the shared database connection, opening it on first use"""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute('PRAGMA cache_size=-65536')
+        _conn.execute('PRAGMA mmap_size=268435456')
+        _conn.execute('PRAGMA temp_store=MEMORY')
+
+        # The collector owns the schema; only gather planner stats the
+        # first time, not as a full-table scan on every export
+        if not has_stats(_conn):
+            _conn.execute('ANALYZE metar_observations')
+    return _conn
+
+
+def has_stats(conn):
+    """Whether ANALYZE has already recorded stats for metar_observations"""
+    try:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_stat1 WHERE tbl = 'metar_observations' LIMIT 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # sqlite_stat1 only exists once ANALYZE has run
+        return False
+    return row is not None
+
 
 def export_to_csv(output_file='metar_export.csv', station=STATION, start_date=None, end_date=None):
     """Export data to CSV format"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    cursor = get_conn().cursor()
 
     query = 'SELECT * FROM metar_observations WHERE station = ?'
     params = [station]
@@ -35,29 +65,31 @@ def export_to_csv(output_file='metar_export.csv', station=STATION, start_date=No
     query += ' ORDER BY datetime'
 
     cursor.execute(query, params)
-    rows = cursor.fetchall()
+    batch = cursor.fetchmany(5000)
 
-    if not rows:
+    if not batch:
         print("No data found for the specified criteria")
-        conn.close()
         return 0
 
+    columns = [col[0] for col in cursor.description]
+
+    # sqlite3.Row is tuple-like, so batches go straight to the writer
+    count = 0
     with open(output_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(dict(row))
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        while batch:
+            writer.writerows(batch)
+            count += len(batch)
+            batch = cursor.fetchmany(5000)
 
-    conn.close()
-    print(f"✓ Exported {len(rows)} observations to {output_file}")
-    return len(rows)
+    print(f"✓ Exported {count} observations to {output_file}")
+    return count
 
 
 def export_to_json(output_file='metar_export.json', station=STATION, start_date=None, end_date=None):
     """Export data to JSON format"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    cursor = get_conn().cursor()
 
     query = 'SELECT * FROM metar_observations WHERE station = ?'
     params = [station]
@@ -73,27 +105,33 @@ def export_to_json(output_file='metar_export.json', station=STATION, start_date=
     query += ' ORDER BY datetime'
 
     cursor.execute(query, params)
-    rows = cursor.fetchall()
+    cursor.arraysize = 1000
+    batch = cursor.fetchmany()
 
-    if not rows:
+    if not batch:
         print("No data found for the specified criteria")
-        conn.close()
         return 0
 
-    data = [dict(row) for row in rows]
+    # Write the array one row at a time instead of building it in memory
+    count = 0
+    with open(output_file, 'wb') as f:
+        f.write(b'[')
+        while batch:
+            for row in batch:
+                if count:
+                    f.write(b',')
+                f.write(orjson.dumps(dict(row)))
+                count += 1
+            batch = cursor.fetchmany()
+        f.write(b']')
 
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=2)
-
-    conn.close()
-    print(f"✓ Exported {len(rows)} observations to {output_file}")
-    return len(rows)
+    print(f"✓ Exported {count} observations to {output_file}")
+    return count
 
 
 def export_daily_summary(output_file='metar_daily_summary.json', station=STATION):
     """Export daily aggregated summary"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cursor = get_conn().cursor()
 
     cursor.execute('''
         SELECT
@@ -115,7 +153,6 @@ def export_daily_summary(output_file='metar_daily_summary.json', station=STATION
 
     if not rows:
         print("No data found")
-        conn.close()
         return 0
 
     daily_data = []
@@ -134,15 +171,13 @@ def export_daily_summary(output_file='metar_daily_summary.json', station=STATION
     with open(output_file, 'w') as f:
         json.dump(daily_data, f, indent=2)
 
-    conn.close()
     print(f"✓ Exported {len(daily_data)} days to {output_file}")
     return len(daily_data)
 
 
 def show_statistics(station=STATION):
     """Display database statistics"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cursor = get_conn().cursor()
 
     # Overall stats
     cursor.execute('''
@@ -168,8 +203,6 @@ def show_statistics(station=STATION):
 
     days_count = cursor.fetchone()[0]
 
-    conn.close()
-
     print("\n" + "=" * 60)
     print(f"METAR Database Statistics for {station}")
     print("=" * 60)
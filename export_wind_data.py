@@ -5,14 +5,101 @@ Fetches data from OGIMET for the year 2025 with Canary Islands local time
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import csv
 import json
 import time
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, NamedTuple, Union
+from operator import attrgetter
 import re
-import pytz
+from zoneinfo import ZoneInfo
+
+
+UTC = timezone.utc
+CANARY = ZoneInfo('Atlantic/Canary')
+
+
+class WindObs(NamedTuple):
+    """Parsed wind observation, fields in CSV column order"""
+    datetime_local: str
+    datetime_utc: str
+    wind_direction: Union[int, str]
+    sustained_speed_kt: float
+    sustained_speed_kmh: float
+    gust_speed_kt: Optional[float]
+    gust_speed_kmh: Optional[float]
+    unit: str
+    synop: str
+
+
+def decode_synop_wind(synop: str, block: str) -> Optional[tuple]:
+    """
+    Decode the wind groups of a SYNOP message
+
+    Pure string/int kernel with no datetime or timezone work, so it stays
+    cheap to call once per observation.
+
+    Returns:
+        Tuple (wind_direction, wind_speed, wind_gust, wind_unit_code),
+        or None if the station block or wind group is missing
+    """
+    groups = synop.split()
+    n = len(groups)
+
+    # Station ID is at index 2 in the fixed AAXX YYGGiw IIiii header;
+    # only fall back to a search for non-standard messages
+    if n > 2 and groups[2] == block:
+        station_idx = 2
+    elif block in groups:
+        station_idx = groups.index(block)
+    else:
+        return None
+
+    # Determine wind unit from iihVV group (first group after station)
+    wind_unit_code = None
+    if station_idx + 1 < n:
+        iihvv_group = groups[station_idx + 1]
+        if len(iihvv_group) >= 2 and iihvv_group[1].isdigit():
+            wind_unit_code = int(iihvv_group[1])
+
+    # The wind group follows the iihVV group and is either:
+    # 1. /ddff - visibility missing, wind direction/speed
+    # 2. Nddff - cloud cover N, wind direction/speed
+    if station_idx + 2 >= n:
+        return None
+
+    wind_group = groups[station_idx + 2]
+    if len(wind_group) != 5 or not wind_group[1:].isdigit():
+        return None
+    if wind_group[0] != '/' and not wind_group[0].isdigit():
+        return None
+
+    # Direction 00-36 (in tens), speed 00-99
+    dir_tens = int(wind_group[1:3])
+    if dir_tens > 36:
+        return None
+    wind_direction = dir_tens * 10
+    wind_speed = int(wind_group[3:5])
+
+    # Look for wind gust in Section 3 (after "333" group):
+    # 910ff (10-min max) or 911ff (1-hr max)
+    wind_gust = None
+    try:
+        section3_idx = groups.index('333', station_idx + 3)
+    except ValueError:
+        section3_idx = -1
+
+    if section3_idx != -1:
+        for group in groups[section3_idx + 1:]:
+            if len(group) == 5 and group.startswith('91'):
+                if group[3:5].isdigit():
+                    wind_gust = int(group[3:5])
+                break
+
+    return wind_direction, wind_speed, wind_gust, wind_unit_code
 
 
 class METARWindExtractor:
@@ -21,8 +108,24 @@ class METARWindExtractor:
     def __init__(self, icao_code: str = "GCGM", synop_block: str = "60007"):
         self.icao_code = icao_code
         self.synop_block = synop_block  # GCGM synop code is 60007
+
+        # One response line: block,year,month,day,hour,minute,synop (NIL reports skipped)
+        self._line_re = re.compile(
+            rf'^{re.escape(synop_block)},(\d{{4}}),(\d{{2}}),(\d{{2}}),(\d{{2}}),(\d{{2}}),(?!.*NIL)[ \t]*(.+?)\s*$',
+            re.MULTILINE
+        )
         self.base_url = "http://www.ogimet.com/cgi-bin/getsynop"
 
+        # Reuse one keep-alive connection for all monthly requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=4,
+            max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[429, 502, 503])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
     def fetch_metar(self, start_date: datetime, end_date: datetime) -> List[tuple]:
         """
         Fetch SYNOP data from OGIMET (contains wind information)
@@ -42,6 +145,11 @@ class METARWindExtractor:
         print(f"Note: OGIMET rate limit is 1 request per 20 seconds")
         print()
 
+        # Responses are parsed on a worker thread so the parsing overlaps
+        # with the rate-limit sleep before the next request
+        executor = ThreadPoolExecutor(max_workers=1)
+        pending = []
+
         request_count = 0
         while current_start < end_date:
             current_end = min(current_start + timedelta(days=max_days_per_request), end_date)
@@ -64,23 +172,23 @@ class METARWindExtractor:
                     'block': self.synop_block
                 }
 
-                response = requests.get(self.base_url, params=params, timeout=30)
+                response = self.session.get(self.base_url, params=params, timeout=30)
+                # SYNOP output is plain ASCII; skip requests' charset detection
+                text = response.content.decode('ascii', errors='ignore')
 
                 # Check for rate limiting
-                if 'quota limit' in response.text.lower():
+                if 'quota limit' in text.lower():
                     print("Rate limit hit, waiting 30s...")
                     time.sleep(30)
-                    response = requests.get(self.base_url, params=params, timeout=30)
+                    response = self.session.get(self.base_url, params=params, timeout=30)
+                    text = response.content.decode('ascii', errors='ignore')
 
                 response.raise_for_status()
 
-                synop_lines = self._parse_synop_response(response.text)
+                future = executor.submit(self._parse_synop_response, text)
+                pending.append((future, current_start.year, current_start.month))
 
-                # Tag each line with year and month
-                for line in synop_lines:
-                    all_data.append((line, current_start.year, current_start.month))
-
-                print(f"✓ {len(synop_lines)} observations")
+                print("✓ received")
                 request_count += 1
 
             except Exception as e:
@@ -88,6 +196,16 @@ class METARWindExtractor:
 
             current_start = current_end
 
+        executor.shutdown(wait=True)
+
+        # Tag each line with year and month
+        print()
+        for future, year, month in pending:
+            synop_lines = future.result()
+            print(f"  {year}-{month:02d}: ✓ {len(synop_lines)} observations")
+            for line in synop_lines:
+                all_data.append((line, year, month))
+
         print()
         print(f"Total observations fetched: {len(all_data)}")
         return all_data
@@ -102,34 +220,22 @@ class METARWindExtractor:
         Returns list of dictionaries with parsed data
         """
         synop_observations = []
-        lines = text.split('\n')
-
-        for line in lines:
-            if not line.strip() or line.startswith('Status:'):
-                continue
-
-            parts = line.split(',', 6)
-            if len(parts) >= 7 and parts[0] == self.synop_block:
-                try:
-                    obs = {
-                        'block': parts[0],
-                        'year': int(parts[1]),
-                        'month': int(parts[2]),
-                        'day': int(parts[3]),
-                        'hour': int(parts[4]),
-                        'minute': int(parts[5]),
-                        'synop': parts[6].strip()
-                    }
-
-                    # Skip NIL reports
-                    if 'NIL' not in obs['synop']:
-                        synop_observations.append(obs)
-                except (ValueError, IndexError):
-                    continue
+
+        # Each match is one non-NIL observation for our block
+        for m in self._line_re.finditer(text):
+            synop_observations.append({
+                'block': self.synop_block,
+                'year': int(m.group(1)),
+                'month': int(m.group(2)),
+                'day': int(m.group(3)),
+                'hour': int(m.group(4)),
+                'minute': int(m.group(5)),
+                'synop': m.group(6)
+            })
 
         return synop_observations
 
-    def parse_wind_data(self, synop_obs: Dict, year: int, month: int) -> Optional[Dict]:
+    def parse_wind_data(self, synop_obs: Dict, year: int, month: int) -> Optional[WindObs]:
         """
         Parse wind information from SYNOP observation
 
@@ -147,100 +253,30 @@ class METARWindExtractor:
         - /1105: wind from 110° at 5 kt
         """
         synop_text = synop_obs['synop']
-        groups = synop_text.split()
 
-        # Find station ID position
-        station_idx = -1
-        for i, group in enumerate(groups):
-            if group == self.synop_block:
-                station_idx = i
-                break
-
-        if station_idx == -1:
+        decoded = decode_synop_wind(synop_text, self.synop_block)
+        if decoded is None:
             return None
 
-        # Determine wind unit from iihVV group (first group after station)
-        wind_unit_code = None
-        if station_idx + 1 < len(groups):
-            iihvv_group = groups[station_idx + 1]
-            if len(iihvv_group) >= 2 and iihvv_group[1].isdigit():
-                wind_unit_code = int(iihvv_group[1])
+        wind_direction, wind_speed, wind_gust, wind_unit_code = decoded
 
         # Decode wind unit: 0=calm, 1=m/s, 3=kt estimated, 4=kt measured
         wind_in_mps = (wind_unit_code == 1)
         wind_unit = 'MPS' if wind_in_mps else 'KT'
 
-        # Parse wind direction and speed from Nddff or /ddff group
-        wind_direction = None
-        wind_speed = None
-
-        # Wind group is the FIRST group after station ID (after iihVV)
-        # Two possible formats:
-        # 1. /ddff - visibility missing, wind direction/speed
-        # 2. Nddff - cloud cover N, wind direction/speed
-
-        # The wind group should be at position station_idx + 2 (after station block and iihVV)
-        if station_idx + 2 < len(groups):
-            wind_group = groups[station_idx + 2]
-
-            # Format 1: /ddff (visibility missing)
-            if wind_group.startswith('/') and len(wind_group) == 5:
-                try:
-                    wind_part = wind_group[1:]  # Remove leading /
-                    dir_tens = int(wind_part[0:2])
-                    speed = int(wind_part[2:4])
-                    if 0 <= dir_tens <= 36 and 0 <= speed <= 99:
-                        wind_direction = dir_tens * 10 if dir_tens > 0 else 0
-                        wind_speed = speed
-                except ValueError:
-                    pass
-
-            # Format 2: Nddff (cloud cover present)
-            elif len(wind_group) == 5 and wind_group.isdigit():
-                try:
-                    cloud_cover = int(wind_group[0])
-                    dir_tens = int(wind_group[1:3])
-                    speed = int(wind_group[3:5])
-                    # Validate: cloud cover 0-9, direction 00-36 (in tens), speed 00-99
-                    if 0 <= cloud_cover <= 9 and 0 <= dir_tens <= 36 and 0 <= speed <= 99:
-                        wind_direction = dir_tens * 10 if dir_tens > 0 else 0
-                        wind_speed = speed
-                except ValueError:
-                    pass
-
-        if wind_direction is None or wind_speed is None:
-            return None
-
-        # Look for wind gust in Section 3 (after "333" group)
-        wind_gust = None
-        try:
-            section3_idx = groups.index('333')
-            # Look for gust groups: 910ff (10-min max) or 911ff (1-hr max)
-            for i in range(section3_idx + 1, len(groups)):
-                group = groups[i]
-                if len(group) == 5 and group.startswith('91'):
-                    gust_type = group[2]  # 0=10min, 1=1hr
-                    gust_value = int(group[3:5])
-                    if 0 <= gust_value <= 99:
-                        wind_gust = gust_value
-                        break
-        except (ValueError, IndexError):
-            pass  # Section 3 not found or no gust data
-
         # Create UTC datetime from observation
         try:
-            utc_tz = pytz.UTC
-            parsed_datetime_utc = utc_tz.localize(datetime(
+            parsed_datetime_utc = datetime(
                 synop_obs['year'],
                 synop_obs['month'],
                 synop_obs['day'],
                 synop_obs['hour'],
-                synop_obs['minute']
-            ))
+                synop_obs['minute'],
+                tzinfo=UTC
+            )
 
             # Convert to Canary Islands time
-            canary_tz = pytz.timezone('Atlantic/Canary')
-            parsed_datetime_canary = parsed_datetime_utc.astimezone(canary_tz)
+            parsed_datetime_canary = parsed_datetime_utc.astimezone(CANARY)
 
         except ValueError:
             return None
@@ -259,81 +295,50 @@ class METARWindExtractor:
         speed_kmh = round(speed_kt * 1.852, 1)
         gust_kmh = round(gust_kt * 1.852, 1) if gust_kt else None
 
-        return {
-            'synop': synop_text,
-            'datetime_utc': parsed_datetime_utc.strftime('%Y-%m-%d %H:%M:%S'),
-            'datetime_local': parsed_datetime_canary.strftime('%Y-%m-%d %H:%M:%S %Z'),
-            'wind_direction': wind_direction if wind_direction != 0 else 'VRB',
-            'sustained_speed_kt': speed_kt,
-            'sustained_speed_kmh': speed_kmh,
-            'gust_speed_kt': gust_kt,
-            'gust_speed_kmh': gust_kmh,
-            'unit': wind_unit
-        }
-
-    def export_to_csv(self, wind_data: List[Dict], filename: str = 'wind_data.csv'):
+        # Fixed-format timestamps built directly from the integer fields
+        utc = parsed_datetime_utc
+        local = parsed_datetime_canary
+        datetime_utc = f"{utc.year:04d}-{utc.month:02d}-{utc.day:02d} {utc.hour:02d}:{utc.minute:02d}:00"
+        datetime_local = (f"{local.year:04d}-{local.month:02d}-{local.day:02d} "
+                          f"{local.hour:02d}:{local.minute:02d}:00 {local.tzname()}")
+
+        return WindObs(
+            datetime_local=datetime_local,
+            datetime_utc=datetime_utc,
+            wind_direction=wind_direction if wind_direction != 0 else 'VRB',
+            sustained_speed_kt=speed_kt,
+            sustained_speed_kmh=speed_kmh,
+            gust_speed_kt=gust_kt,
+            gust_speed_kmh=gust_kmh,
+            unit=wind_unit,
+            synop=synop_text
+        )
+
+    def export_to_csv(self, wind_data: List[WindObs], filename: str = 'wind_data.csv'):
         """Export wind data to CSV file"""
         if not wind_data:
             print("No wind data to export")
             return
 
-        fieldnames = ['datetime_local', 'datetime_utc', 'wind_direction',
-                      'sustained_speed_kt', 'sustained_speed_kmh',
-                      'gust_speed_kt', 'gust_speed_kmh', 'unit', 'synop']
-
         with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+            writer = csv.writer(csvfile)
+            writer.writerow(WindObs._fields)
             writer.writerows(wind_data)
 
         print(f"Exported {len(wind_data)} records to {filename}")
 
-    def export_to_json(self, wind_data: List[Dict], filename: str = 'wind_data.json'):
+    def export_to_json(self, wind_data: List[WindObs], filename: str = 'wind_data.json'):
         """Export wind data to JSON file"""
         if not wind_data:
             print("No wind data to export")
             return
 
         with open(filename, 'w') as jsonfile:
-            json.dump(wind_data, jsonfile, indent=2)
+            json.dump([obs._asdict() for obs in wind_data], jsonfile, indent=2)
 
         print(f"Exported {len(wind_data)} records to {filename}")
 
 
-def aggregate_by_day(wind_data: List[Dict]) -> List[Dict]:
-    """Aggregate wind data by day with min/max/avg values"""
-    daily_data = defaultdict(lambda: {
-        'speeds': [],
-        'gusts': [],
-        'dates': []
-    })
-
-    for record in wind_data:
-        if record.get('date'):
-            date = record['date']
-            daily_data[date]['speeds'].append(record['wind_speed'])
-            if record['wind_gust']:
-                daily_data[date]['gusts'].append(record['wind_gust'])
-
-    aggregated = []
-    for date in sorted(daily_data.keys()):
-        data = daily_data[date]
-        speeds = data['speeds']
-        gusts = data['gusts']
-
-        aggregated.append({
-            'date': date,
-            'avg_speed': round(sum(speeds) / len(speeds), 1) if speeds else 0,
-            'max_speed': max(speeds) if speeds else 0,
-            'min_speed': min(speeds) if speeds else 0,
-            'avg_gust': round(sum(gusts) / len(gusts), 1) if gusts else None,
-            'max_gust': max(gusts) if gusts else None,
-            'observations': len(speeds)
-        })
-
-    return aggregated
-
-
 def main():
     """Main execution function"""
     print("=" * 70)
@@ -355,42 +360,34 @@ def main():
 
     print(f"\nParsing wind data from {len(synop_data)} observations...")
 
-    # Parse wind data from each SYNOP observation
-    wind_data = []
+    # Parse wind data from each SYNOP observation, keeping the first
+    # record seen for each datetime
+    by_dt = {}
     for synop_obs, year, month in synop_data:
         parsed = extractor.parse_wind_data(synop_obs, year, month)
-        if parsed and parsed.get('datetime_utc'):
-            wind_data.append(parsed)
+        if parsed and parsed.datetime_utc and parsed.datetime_utc not in by_dt:
+            by_dt[parsed.datetime_utc] = parsed
 
-    if not wind_data:
+    if not by_dt:
         print("No wind data found in SYNOP observations")
         return
 
     # Sort by datetime
-    wind_data.sort(key=lambda x: x['datetime_utc'] if x['datetime_utc'] else '')
-
-    # Remove duplicates based on datetime
-    seen_datetimes = set()
-    unique_wind_data = []
-    for record in wind_data:
-        dt = record['datetime_utc']
-        if dt and dt not in seen_datetimes:
-            seen_datetimes.add(dt)
-            unique_wind_data.append(record)
+    unique_wind_data = sorted(by_dt.values(), key=attrgetter('datetime_utc'))
 
     print(f"Parsed {len(unique_wind_data)} unique observations with wind data")
 
     # Display statistics
     if unique_wind_data:
-        speeds = [d['sustained_speed_kt'] for d in unique_wind_data if d['sustained_speed_kt']]
-        gusts = [d['gust_speed_kt'] for d in unique_wind_data if d['gust_speed_kt']]
+        speeds = [d.sustained_speed_kt for d in unique_wind_data if d.sustained_speed_kt]
+        gusts = [d.gust_speed_kt for d in unique_wind_data if d.gust_speed_kt]
 
         print()
         print("Wind Data Summary:")
         print(f"  Total observations: {len(unique_wind_data)}")
-        if unique_wind_data[0]['datetime_local']:
-            print(f"  First: {unique_wind_data[0]['datetime_local']}")
-            print(f"  Last: {unique_wind_data[-1]['datetime_local']}")
+        if unique_wind_data[0].datetime_local:
+            print(f"  First: {unique_wind_data[0].datetime_local}")
+            print(f"  Last: {unique_wind_data[-1].datetime_local}")
         if speeds:
             print(f"  Avg sustained wind: {sum(speeds)/len(speeds):.1f} kt ({sum(speeds)/len(speeds)*1.852:.1f} km/h)")
             print(f"  Max sustained wind: {max(speeds)} kt ({max(speeds)*1.852:.1f} km/h)")
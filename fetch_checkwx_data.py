@@ -8,10 +8,49 @@ Free tier: 50 requests/day, perfect for fetching historical data
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import numpy as np
+import re
 import sys
+import threading
 from datetime import datetime, timedelta
-import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+
+MAX_PARALLEL_CHUNKS = 4
+DAILY_REQUEST_BUDGET = 45  # Per-run cap, headroom under the free tier's 50 requests/day
+
+_WIND_RE = re.compile(r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS)')
+_TIME_RE = re.compile(r'\b(\d{6}Z)\b')
+
+
+# Retry connection failures only; those never reach CheckWX or cost quota
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, connect=3, read=0, status=0, other=0, backoff_factor=1,
+                      raise_on_status=False)
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+
+class WindRecord(NamedTuple):
+    """Parsed wind observation, fields in JSON key order"""
+    metar: str
+    observation_time: Optional[str]
+    datetime: Optional[str]
+    date: Optional[str]
+    wind_direction: str
+    wind_speed: int
+    wind_gust: Optional[int]
+    unit: str
+    timestamp: str
 
 
 def fetch_checkwx_metar(api_key, station='GCGM', days_back=30):
@@ -35,9 +74,10 @@ def fetch_checkwx_metar(api_key, station='GCGM', days_back=30):
     print()
 
     base_url = "https://api.checkwx.com/metar"
-    headers = {
-        'X-API-Key': api_key
-    }
+    SESSION.headers.update({
+        'X-API-Key': api_key,
+        'Accept-Encoding': 'gzip'
+    })
 
     all_wind_data = []
 
@@ -49,9 +89,15 @@ def fetch_checkwx_metar(api_key, station='GCGM', days_back=30):
     chunk_size = 7
     num_chunks = (days_back + chunk_size - 1) // chunk_size
 
+    if num_chunks > DAILY_REQUEST_BUDGET:
+        print(f"✗ {num_chunks} chunks exceeds the {DAILY_REQUEST_BUDGET} requests/day budget")
+        print(f"Use days_back <= {DAILY_REQUEST_BUDGET * chunk_size}, or split the fetch across days.")
+        return None
+
     print(f"Will fetch data in {num_chunks} chunks...")
     print()
 
+    chunks = []
     for i in range(num_chunks):
         chunk_end = end_date - timedelta(days=i * chunk_size)
         chunk_start = chunk_end - timedelta(days=chunk_size)
@@ -60,116 +106,217 @@ def fetch_checkwx_metar(api_key, station='GCGM', days_back=30):
         if (end_date - chunk_start).days > days_back:
             chunk_start = end_date - timedelta(days=days_back)
 
-        start_str = chunk_start.strftime('%Y-%m-%dT%H:%M:%SZ')
-        end_str = chunk_end.strftime('%Y-%m-%dT%H:%M:%SZ')
-
+        chunks.append((chunk_start, chunk_end))
+
+    # The first chunk goes alone, so a bad key or exhausted quota costs one
+    # request. The rest are independent and fetched concurrently; a 401/429
+    # sets `stop` so chunks that haven't started yet don't spend quota
+    stop = threading.Event()
+    results = [fetch_checkwx_chunk(base_url, station, *chunks[0], stop=stop)] if chunks else []
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHUNKS) as executor:
+        futures = [
+            executor.submit(fetch_checkwx_chunk, base_url, station, *chunk, stop=stop)
+            for chunk in chunks[1:]
+        ]
+        results.extend(future.result() for future in futures)
+
+    end_iso = end_date.isoformat()
+    for i, ((chunk_start, chunk_end), (status, payload)) in enumerate(zip(chunks, results)):
         print(f"Chunk {i+1}/{num_chunks}: {chunk_start.date()} to {chunk_end.date()}...", end=' ')
 
-        try:
-            # CheckWX URL format
-            url = f"{base_url}/{station}/{start_str}/{end_str}"
+        if status == 200:
+            if payload:
+                # Parse each METAR
+                for metar_text in payload:
+                    wind_record = parse_checkwx_metar(metar_text, now=end_date, now_iso=end_iso)
+                    if wind_record:
+                        all_wind_data.append(wind_record)
 
-            response = requests.get(url, headers=headers, timeout=30)
+                print(f"✓ {len(payload)} reports")
+            else:
+                print("✓ No reports")
 
-            if response.status_code == 200:
-                data = response.json()
+        elif status == 401:
+            print("✗ Invalid API key")
+            print("\nGet your free API key at: https://www.checkwx.com/")
+            return None
 
-                if data.get('results') and data.get('results') > 0:
-                    metars = data.get('data', [])
+        elif status == 429:
+            print("✗ Rate limit exceeded")
+            print("Free tier allows 50 requests/day. Try again tomorrow.")
+            return None
 
-                    # Parse each METAR
-                    for metar_text in metars:
-                        wind_record = parse_checkwx_metar(metar_text)
-                        if wind_record:
-                            all_wind_data.append(wind_record)
+        elif status == 'skipped':
+            print("✗ Skipped after an earlier error")
 
-                    print(f"✓ {len(metars)} reports")
-                else:
-                    print("✓ No reports")
+        elif status is None:
+            print(f"✗ Error: {str(payload)[:50]}")
 
-            elif response.status_code == 401:
-                print("✗ Invalid API key")
-                print("\nGet your free API key at: https://www.checkwx.com/")
-                return None
+        else:
+            print(f"✗ HTTP {status}")
 
-            elif response.status_code == 429:
-                print("✗ Rate limit exceeded")
-                print("Free tier allows 50 requests/day. Try again tomorrow.")
-                return None
+    print()
+    print(f"Total observations fetched: {len(all_wind_data)}")
 
-            else:
-                print(f"✗ HTTP {response.status_code}")
+    return all_wind_data
 
-        except Exception as e:
-            print(f"✗ Error: {str(e)[:50]}")
 
-        # Be nice to the API - small delay between requests
-        if i < num_chunks - 1:
-            time.sleep(1)
+def fetch_checkwx_chunk(base_url, station, chunk_start, chunk_end, stop=None):
+    """
+    Fetch one date-range chunk from CheckWX
 
-    print()
-    print(f"Total observations fetched: {len(all_wind_data)}")
+    Sets `stop` on 401/429, and returns ('skipped', None) without a request
+    if it is already set.
 
-    return all_wind_data
+    Returns:
+        Tuple (status_code, metars); status_code is None and metars is the
+        exception if the request itself failed
+    """
+    if stop is not None and stop.is_set():
+        return 'skipped', None
+
+    start_str = chunk_start.strftime('%Y-%m-%dT%H:%M:%SZ')
+    end_str = chunk_end.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    try:
+        # CheckWX URL format
+        url = f"{base_url}/{station}/{start_str}/{end_str}"
+
+        response = SESSION.get(url, timeout=30)
+
+        if response.status_code != 200:
+            if response.status_code in (401, 429) and stop is not None:
+                stop.set()
+            return response.status_code, None
+
+        data = response.json()
+
+        if data.get('results') and data.get('results') > 0:
+            return 200, data.get('data', [])
+        return 200, []
 
+    except Exception as e:
+        return None, e
 
-def parse_checkwx_metar(metar_text):
+
+def scan_metar_tokens(metar_text):
     """
-    Parse wind data from METAR text
+    Find the wind group and DDHHmmZ time token by slicing whitespace tokens
+
+    Falls back to the regexes only for whichever part no token matched.
+
+    Returns:
+        Tuple ((direction, speed, gust, unit) or None, obs_time or None)
     """
-    import re
+    wind = None
+    obs_time = None
+
+    for tok in metar_text.split():
+        if wind is None:
+            wind = _split_wind_token(tok)
+        if obs_time is None and len(tok) == 7 and tok[6] == 'Z' and tok[:6].isdecimal():
+            obs_time = tok
+        if wind is not None and obs_time is not None:
+            break
+
+    if wind is None:
+        match = _WIND_RE.search(metar_text)
+        if match:
+            wind = (match.group(1), int(match.group(2)),
+                    int(match.group(3)) if match.group(3) else None, match.group(4))
+
+    if obs_time is None:
+        time_match = _TIME_RE.search(metar_text)
+        obs_time = time_match.group(1) if time_match else None
+
+    return wind, obs_time
+
+
+def _split_wind_token(tok):
+    """Slice a dddff[Gff]KT-style token into (direction, speed, gust, unit)"""
+    if tok.endswith('KT'):
+        unit = 'KT'
+    elif tok.endswith('MPS'):
+        unit = 'MPS'
+    else:
+        return None
 
-    if not metar_text:
+    body = tok[:-len(unit)]
+    if len(body) < 5:
         return None
 
-    # Wind pattern
-    wind_pattern = r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS)'
+    direction = body[:3]
+    if direction != 'VRB' and not direction.isdecimal():
+        return None
+
+    speed, sep, gust = body[3:].partition('G')
+    if not (2 <= len(speed) <= 3 and speed.isdecimal()):
+        return None
+    if sep and not (2 <= len(gust) <= 3 and gust.isdecimal()):
+        return None
+
+    return direction, int(speed), int(gust) if gust else None, unit
+
+
+@lru_cache(maxsize=64)
+def _resolve_year_month(day, now_day, now_month, now_year):
+    """Year and month of a DDHHmmZ day: the previous month if it's ahead of today"""
+    if day > now_day:
+        if now_month == 1:
+            return now_year - 1, 12
+        return now_year, now_month - 1
+    return now_year, now_month
 
-    match = re.search(wind_pattern, metar_text)
-    if not match:
+
+def parse_checkwx_metar(metar_text, now=None, now_iso=None):
+    """
+    Parse wind data from METAR text
+
+    `now`/`now_iso` (naive UTC) come from fetch_checkwx_metar, once per run.
+    """
+    if not metar_text:
         return None
 
-    direction = match.group(1)
-    speed = int(match.group(2))
-    gust = int(match.group(3)) if match.group(3) else None
-    unit = match.group(4)
+    if now is None:
+        now = datetime.utcnow()
+    if now_iso is None:
+        now_iso = now.isoformat()
+
+    # Wind group and observation time
+    wind, obs_time = scan_metar_tokens(metar_text)
+    if wind is None:
+        return None
 
-    # Extract observation time
-    time_pattern = r'\b(\d{6}Z)\b'
-    time_match = re.search(time_pattern, metar_text)
-    obs_time = time_match.group(1) if time_match else None
+    direction, speed, gust, unit = wind
 
     # Parse datetime
-    parsed_datetime = None
+    date_str = iso_str = None
     if obs_time:
         day = int(obs_time[0:2])
         hour = int(obs_time[2:4])
         minute = int(obs_time[4:6])
 
-        now = datetime.utcnow()
-        if day > now.day:
-            month = now.month - 1 if now.month > 1 else 12
-            year = now.year if now.month > 1 else now.year - 1
-        else:
-            month = now.month
-            year = now.year
+        year, month = _resolve_year_month(day, now.day, now.month, now.year)
 
         try:
-            parsed_datetime = datetime(year, month, day, hour, minute)
+            datetime(year, month, day, hour, minute)  # Reject impossible dates
         except ValueError:
             pass
-
-    return {
-        'metar': metar_text.strip(),
-        'observation_time': obs_time,
-        'datetime': parsed_datetime.isoformat() if parsed_datetime else None,
-        'date': parsed_datetime.strftime('%Y-%m-%d') if parsed_datetime else None,
-        'wind_direction': direction,
-        'wind_speed': speed,
-        'wind_gust': gust,
-        'unit': unit,
-        'timestamp': datetime.utcnow().isoformat()
-    }
+        else:
+            date_str = f"{year:04d}-{month:02d}-{day:02d}"
+            iso_str = f"{date_str}T{hour:02d}:{minute:02d}:00"
+
+    return WindRecord(
+        metar=metar_text.strip(),
+        observation_time=obs_time,
+        datetime=iso_str,
+        date=date_str,
+        wind_direction=direction,
+        wind_speed=speed,
+        wind_gust=gust,
+        unit=unit,
+        timestamp=now_iso
+    )
 
 
 def save_to_json(wind_data, output_file='la_gomera_wind_data.json'):
@@ -180,28 +327,29 @@ def save_to_json(wind_data, output_file='la_gomera_wind_data.json'):
         print("No wind data to save")
         return
 
-    # Sort by datetime
-    wind_data.sort(key=lambda x: x.get('datetime', ''))
+    # Sort by datetime (missing datetimes first); keys are extracted once
+    keys = [d.datetime or '' for d in wind_data]
+    wind_data[:] = [wind_data[i] for i in sorted(range(len(wind_data)), key=keys.__getitem__)]
 
     # Save
-    with open(output_file, 'w') as f:
-        json.dump(wind_data, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps([d._asdict() for d in wind_data], option=orjson.OPT_INDENT_2))
 
     print(f"✓ Saved {len(wind_data)} observations to {output_file}")
 
     # Display stats
-    speeds = [d['wind_speed'] for d in wind_data]
-    gusts = [d['wind_gust'] for d in wind_data if d['wind_gust']]
+    speeds = np.fromiter((d.wind_speed for d in wind_data), dtype=np.int16, count=len(wind_data))
+    gusts = np.fromiter((d.wind_gust for d in wind_data if d.wind_gust), dtype=np.int16)
 
     print()
     print("Wind Data Summary:")
-    print(f"  First observation: {wind_data[0]['date']}")
-    print(f"  Last observation:  {wind_data[-1]['date']}")
-    print(f"  Avg wind speed: {sum(speeds)/len(speeds):.1f} kt")
-    print(f"  Max wind speed: {max(speeds)} kt")
-    if gusts:
-        print(f"  Observations with gusts: {len(gusts)}")
-        print(f"  Max gust: {max(gusts)} kt")
+    print(f"  First observation: {wind_data[0].date}")
+    print(f"  Last observation:  {wind_data[-1].date}")
+    print(f"  Avg wind speed: {speeds.mean():.1f} kt")
+    print(f"  Max wind speed: {speeds.max()} kt")
+    if gusts.size:
+        print(f"  Observations with gusts: {gusts.size}")
+        print(f"  Max gust: {gusts.max()} kt")
 
 
 def main():
@@ -218,7 +366,7 @@ def main():
         print(f"  python3 {sys.argv[0]} YOUR_API_KEY [days_back]")
         print()
         print("Example:")
-        print(f"  python3 {sys.argv[0]} abc123xyz456 365")
+        print(f"  python3 {sys.argv[0]} abc123xyz456 300")
         print()
         print("Get your FREE API key at: https://www.checkwx.com/")
         print("  - Sign up (free)")
@@ -227,7 +375,7 @@ def main():
         print()
         print("Optional:")
         print("  days_back: Number of days of history (default: 30)")
-        print("             Free tier works well up to ~365 days")
+        print(f"             Up to {DAILY_REQUEST_BUDGET * 7} days per run on the free tier")
         return
 
     api_key = sys.argv[1]
@@ -4,12 +4,39 @@ Fetch historical METAR data from Iowa State ASOS Archive
 This can get months or years of data for La Gomera Airport
 """
 
-import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
+from io import BytesIO
 import json
 
-def fetch_iowa_state_metar(station='GCGM', start_date=None, end_date=None):
+
+# Cached on disk (ETag/Last-Modified aware) so re-runs don't re-download
+SESSION = requests_cache.CachedSession(
+    'metar_cache',
+    backend='sqlite',
+    cache_control=True,
+    expire_after=timedelta(days=7)
+)
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                      respect_retry_after_header=True, raise_on_status=False)
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+# Ask for compression explicitly; the CSV export shrinks ~8x gzipped
+SESSION.headers.update({
+    'Accept-Encoding': 'gzip, deflate',
+    'User-Agent': 'metar-collector/1.0'
+})
+
+
+def fetch_iowa_state_metar(station='GCGM', start_date=None, end_date=None, save_raw=False):
     """
     Fetch historical METAR data from Iowa State ASOS Archive
 
@@ -17,6 +44,7 @@ def fetch_iowa_state_metar(station='GCGM', start_date=None, end_date=None):
         station: ICAO code (default: GCGM for La Gomera)
         start_date: Start date as datetime or string 'YYYY-MM-DD'
         end_date: End date as datetime or string 'YYYY-MM-DD'
+        save_raw: Also write the raw CSV to disk (default: False)
 
     Returns:
         DataFrame with METAR data
@@ -62,19 +90,22 @@ def fetch_iowa_state_metar(station='GCGM', start_date=None, end_date=None):
 
     try:
         print("Downloading data from Iowa State ASOS Archive...")
-        response = requests.get(base_url, params=params, timeout=60)
+        response = SESSION.get(base_url, params=params, timeout=60, stream=True)
         response.raise_for_status()
+        response.raw.decode_content = True
 
-        # Save raw CSV
-        csv_file = f'{station}_historical_{start_date.date()}_to_{end_date.date()}.csv'
-        with open(csv_file, 'w') as f:
-            f.write(response.text)
+        if save_raw:
+            # Save raw CSV
+            csv_file = f'{station}_historical_{start_date.date()}_to_{end_date.date()}.csv'
+            with open(csv_file, 'wb') as f:
+                f.write(response.content)
 
-        print(f"✓ Downloaded raw data to {csv_file}")
+            print(f"✓ Downloaded raw data to {csv_file}")
 
-        # Parse CSV
-        from io import StringIO
-        df = pd.read_csv(StringIO(response.text), low_memory=False)
+            df = pd.read_csv(BytesIO(response.content), low_memory=False)
+        else:
+            # Parse the CSV straight off the response stream
+            df = pd.read_csv(response.raw, low_memory=False)
 
         print(f"✓ Found {len(df)} observations")
         print()
@@ -117,44 +148,39 @@ def convert_to_visualization_format(df, output_file='la_gomera_wind_data.json'):
     print()
     print("Converting to visualization format...")
 
-    data = []
-    for idx, row in df.iterrows():
-        try:
-            # Parse timestamp
-            obs_time = pd.to_datetime(row['valid'])
-
-            # Get wind data (Iowa State uses 'drct' for direction, 'sknt' for speed knots)
-            direction = row.get('drct')
-            speed = row.get('sknt')
-            gust = row.get('gust')
-
-            # Skip if no wind data
-            if pd.isna(speed):
-                continue
-
-            # Format direction
-            if pd.isna(direction) or direction == 0:
-                direction_str = 'VRB'
-            else:
-                direction_str = f"{int(direction):03d}"
-
-            record = {
-                'observation_time': obs_time.strftime('%d%H%MZ'),
-                'datetime': obs_time.isoformat(),
-                'date': obs_time.strftime('%Y-%m-%d'),
-                'wind_direction': direction_str,
-                'wind_speed': int(speed),
-                'wind_gust': int(gust) if pd.notna(gust) else None,
-                'unit': 'KT',
-                'timestamp': datetime.utcnow().isoformat(),
-                'metar': row.get('metar', '')
-            }
-
-            data.append(record)
-
-        except Exception as e:
-            # Skip problematic rows
-            continue
+    # Work column-wise; rows without a timestamp or wind speed are dropped
+    valid = pd.to_datetime(df['valid'], errors='coerce')
+    speed = pd.to_numeric(df['sknt'], errors='coerce')
+    keep = valid.notna() & speed.notna()
+
+    df = df[keep]
+    valid = valid[keep]
+    speed = speed[keep]
+
+    # Get wind data (Iowa State uses 'drct' for direction, 'sknt' for speed knots)
+    direction = pd.to_numeric(df['drct'], errors='coerce') if 'drct' in df else pd.Series(np.nan, index=df.index)
+    gust = pd.to_numeric(df['gust'], errors='coerce') if 'gust' in df else pd.Series(np.nan, index=df.index)
+
+    # Format direction
+    direction_str = np.where(
+        direction.isna() | (direction == 0),
+        'VRB',
+        direction.fillna(0).astype(int).map('{:03d}'.format)
+    )
+
+    records = pd.DataFrame({
+        'observation_time': valid.dt.strftime('%d%H%MZ'),
+        'datetime': valid.dt.strftime('%Y-%m-%dT%H:%M:%S'),
+        'date': valid.dt.strftime('%Y-%m-%d'),
+        'wind_direction': direction_str,
+        'wind_speed': speed.astype(int),
+        'wind_gust': np.trunc(gust).astype('Int64').astype(object).where(gust.notna(), None),
+        'unit': 'KT',
+        'timestamp': datetime.utcnow().isoformat(),
+        'metar': df['metar'].fillna('') if 'metar' in df else ''
+    }, index=df.index)
+
+    data = records.to_dict(orient='records')
 
     # Save to JSON
     with open(output_file, 'w') as f:
@@ -4,11 +4,67 @@ Fetch historical METAR data from OGIMET
 OGIMET has excellent coverage for European/Canary Islands airports
 """
 
-import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
-import json
+import orjson
+import numpy as np
+import time
 from datetime import datetime, timedelta
 from collections import defaultdict
+from multiprocessing import Pool
+from functools import lru_cache, partial
+from typing import NamedTuple, Optional
+
+
+REQUEST_SPACING = 21  # Seconds between request starts (OGIMET allows 1 per 20s)
+PARALLEL_PARSE_MIN = 5000  # Below this, process start-up outweighs the parse
+
+_WIND_RE = re.compile(r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS|KPH)')
+_TIME_RE = re.compile(r'\b(\d{6}Z)\b')
+# Text-mode line: YYYYMMDDHHMM METAR|SPECI [COR] ICAO DDHHmmZ [rest of METAR]
+_OGIMET_LINE_RE = re.compile(r'^\d{12}\s+[A-Z]+\s+(?:COR\s+)?(([A-Z]{4})\s+\d{6}Z.*)$')
+
+
+def _cacheable(response):
+    """OGIMET serves its quota-exceeded page with a 200; never cache it"""
+    return b'quota limit' not in (response.content or b'').lower()
+
+
+# Responses are cached on disk, so re-runs over the same window skip OGIMET
+SESSION = requests_cache.CachedSession(
+    'metar_cache',
+    backend='sqlite',
+    cache_control=True,
+    expire_after=timedelta(days=7),
+    filter_fn=_cacheable
+)
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504],
+                      raise_on_status=False)
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+SESSION.headers['Accept-Encoding'] = 'gzip'
+
+# When the next uncached request may start
+_next_request_at = 0.0
+
+
+class WindRecord(NamedTuple):
+    """Parsed wind observation, fields in JSON key order"""
+    metar: str
+    observation_time: Optional[str]
+    datetime: Optional[str]
+    date: Optional[str]
+    wind_direction: str
+    wind_speed: int
+    wind_gust: Optional[int]
+    unit: str
+    timestamp: str
 
 
 def fetch_ogimet_metar(station='GCGM', start_date=None, end_date=None):
@@ -43,18 +99,8 @@ def fetch_ogimet_metar(station='GCGM', start_date=None, end_date=None):
     print(f"Duration: {(end_date - start_date).days} days")
     print()
 
-    # OGIMET URL format
-    base_url = "https://www.ogimet.com/cgi-bin/getmetar"
-
-    # Format dates for OGIMET (YYYYMMDDHH format)
-    begin_str = start_date.strftime('%Y%m%d%H')
-    end_str = end_date.strftime('%Y%m%d%H')
-
-    params = {
-        'begin': begin_str,
-        'end': end_str,
-        'station': station
-    }
+    # OGIMET text-mode endpoint: one report per line, no HTML to wade through
+    base_url = "https://www.ogimet.com/display_metars2.php"
 
     all_metars = []
 
@@ -62,136 +108,223 @@ def fetch_ogimet_metar(station='GCGM', start_date=None, end_date=None):
     max_days_per_request = 31
     current_start = start_date
 
+    chunks = []
     while current_start < end_date:
         current_end = min(current_start + timedelta(days=max_days_per_request), end_date)
+        chunks.append((current_start, current_end))
+        current_start = current_end
 
-        chunk_begin = current_start.strftime('%Y%m%d%H')
-        chunk_end = current_end.strftime('%Y%m%d%H')
+    print(f"Fetching {len(chunks)} chunks (uncached ones {REQUEST_SPACING}s apart for OGIMET's rate limit)...")
+    print()
 
-        print(f"Fetching {current_start.date()} to {current_end.date()}...", end=' ')
+    # One at a time: OGIMET's spacing leaves nothing for parallel fetches to overlap
+    for chunk_start, chunk_end in chunks:
+        print(f"Fetching {chunk_start.date()} to {chunk_end.date()}...", end=' ', flush=True)
+        metars, error = fetch_ogimet_chunk(base_url, station, chunk_start, chunk_end)
 
-        try:
-            params = {
-                'begin': chunk_begin,
-                'end': chunk_end,
-                'station': station
-            }
+        if error is not None:
+            print(f"✗ Error: {str(error)[:50]}")
+            continue
 
-            response = requests.get(base_url, params=params, timeout=30)
-            response.raise_for_status()
+        all_metars.extend(metars)
+        print(f"✓ {len(metars)} reports")
 
-            # Parse METAR reports from HTML
-            metars = parse_ogimet_response(response.text)
-            all_metars.extend(metars)
+    print()
+    print(f"Total METAR reports fetched: {len(all_metars)}")
 
-            print(f"✓ {len(metars)} reports")
+    return all_metars
 
-        except Exception as e:
-            print(f"✗ Error: {str(e)[:50]}")
 
-        current_start = current_end
+def fetch_ogimet_chunk(base_url, station, chunk_start, chunk_end):
+    """
+    Fetch and parse one date-range chunk from OGIMET
 
-    print()
-    print(f"Total METAR reports fetched: {len(all_metars)}")
+    Returns:
+        Tuple (metars, error); error is the exception if the request failed
+    """
+    params = {
+        'lang': 'en',
+        'lugar': station,
+        'tipo': 'SA',
+        'ord': 'DIR',
+        'nil': 'SI',
+        'fmt': 'txt',
+        'ano': chunk_start.year,
+        'mes': chunk_start.month,
+        'day': chunk_start.day,
+        'hora': chunk_start.hour,
+        'anof': chunk_end.year,
+        'mesf': chunk_end.month,
+        'dayf': chunk_end.day,
+        'horaf': chunk_end.hour,
+        'minf': chunk_end.minute
+    }
 
-    return all_metars
+    try:
+        # Cache hits don't touch ogimet.com, so only real requests wait
+        response = SESSION.get(base_url, params=params, timeout=30, only_if_cached=True)
+        if response.status_code == 504:
+            wait_for_request_slot()
+            response = SESSION.get(base_url, params=params, timeout=30)
+        response.raise_for_status()
+
+        if 'quota limit' in response.text.lower():
+            raise RuntimeError("OGIMET quota limit reached")
+
+        return parse_ogimet_response(response.text, station), None
 
+    except Exception as e:
+        return [], e
 
-def parse_ogimet_response(html_text):
+
+def wait_for_request_slot():
+    """Block until REQUEST_SPACING has passed since the last request start"""
+    global _next_request_at
+
+    delay = _next_request_at - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    _next_request_at = time.monotonic() + REQUEST_SPACING
+
+
+def parse_ogimet_response(text, station='GCGM'):
     """
-    Parse METAR reports from OGIMET HTML response
+    Parse the given station's METAR reports from OGIMET text-mode response
     """
+    # Duplicates are dropped as we go, preserving order
     metars = []
+    seen = set()
 
-    # OGIMET returns METAR in <pre> tags or plain text
-    # Pattern: GCGM DDHHmmZ [rest of METAR]
-    metar_pattern = r'(GCGM\s+\d{6}Z.*?)(?=GCGM\s+\d{6}Z|$)'
+    # One report per line, prefixed by its YYYYMMDDHHMM timestamp
+    for line in text.splitlines():
+        match = _OGIMET_LINE_RE.match(line)
+        if match and match.group(2) == station:
+            metar = ' '.join(match.group(1).split())
+            if metar not in seen:
+                seen.add(metar)
+                metars.append(metar)
 
-    matches = re.findall(metar_pattern, html_text, re.DOTALL)
+    return metars
 
-    for match in matches:
-        # Clean up the METAR text
-        metar = ' '.join(match.split())
-        if metar and 'GCGM' in metar:
-            metars.append(metar)
 
-    # If the above pattern doesn't work, try line-by-line
-    if len(metars) == 0:
-        lines = html_text.split('\n')
-        for line in lines:
-            if 'GCGM' in line and re.search(r'\d{6}Z', line):
-                metar = ' '.join(line.split())
-                if metar:
-                    metars.append(metar)
+def scan_metar_tokens(metar_text):
+    """
+    Find the wind group and DDHHmmZ time token by slicing whitespace tokens
 
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_metars = []
-    for metar in metars:
-        if metar not in seen:
-            seen.add(metar)
-            unique_metars.append(metar)
+    Falls back to the regexes only for whichever part no token matched.
+
+    Returns:
+        Tuple ((direction, speed, gust, unit) or None, obs_time or None)
+    """
+    wind = None
+    obs_time = None
+
+    for tok in metar_text.split():
+        if wind is None:
+            wind = _split_wind_token(tok)
+        if obs_time is None and len(tok) == 7 and tok[6] == 'Z' and tok[:6].isdecimal():
+            obs_time = tok
+        if wind is not None and obs_time is not None:
+            break
+
+    if wind is None:
+        match = _WIND_RE.search(metar_text)
+        if match:
+            wind = (match.group(1), int(match.group(2)),
+                    int(match.group(3)) if match.group(3) else None, match.group(4))
+
+    if obs_time is None:
+        time_match = _TIME_RE.search(metar_text)
+        obs_time = time_match.group(1) if time_match else None
+
+    return wind, obs_time
+
+
+def _split_wind_token(tok):
+    """Slice a dddff[Gff]KT-style token into (direction, speed, gust, unit)"""
+    if tok.endswith('KT'):
+        unit = 'KT'
+    elif tok.endswith('MPS'):
+        unit = 'MPS'
+    elif tok.endswith('KPH'):
+        unit = 'KPH'
+    else:
+        return None
+
+    body = tok[:-len(unit)]
+    if len(body) < 5:
+        return None
+
+    direction = body[:3]
+    if direction != 'VRB' and not direction.isdecimal():
+        return None
+
+    speed, sep, gust = body[3:].partition('G')
+    if not (2 <= len(speed) <= 3 and speed.isdecimal()):
+        return None
+    if sep and not (2 <= len(gust) <= 3 and gust.isdecimal()):
+        return None
 
-    return unique_metars
+    return direction, int(speed), int(gust) if gust else None, unit
 
 
-def parse_wind_data(metar_text):
+@lru_cache(maxsize=64)
+def _resolve_year_month(day, now_day, now_month, now_year):
+    """Year and month of a DDHHmmZ day: the previous month if it's ahead of today"""
+    if day > now_day:
+        if now_month == 1:
+            return now_year - 1, 12
+        return now_year, now_month - 1
+    return now_year, now_month
+
+
+def parse_wind_data(metar_text, now=None, now_iso=None):
     """
     Parse wind information from METAR text
+
+    convert_to_json passes one `now`/`now_iso` (naive UTC) for the batch.
     """
-    # Wind pattern: dddssGggKT or dddssKT
-    wind_pattern = r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS|KPH)'
+    if now is None:
+        now = datetime.utcnow()
+    if now_iso is None:
+        now_iso = now.isoformat()
 
-    match = re.search(wind_pattern, metar_text)
-    if not match:
+    # Wind group (dddssGggKT or dddssKT) and observation time (DDHHmmZ)
+    wind, obs_time = scan_metar_tokens(metar_text)
+    if wind is None:
         return None
 
-    direction = match.group(1)
-    speed = int(match.group(2))
-    gust = int(match.group(3)) if match.group(3) else None
-    unit = match.group(4)
-
-    # Extract observation time (DDHHmmZ)
-    time_pattern = r'\b(\d{6}Z)\b'
-    time_match = re.search(time_pattern, metar_text)
-    obs_time = time_match.group(1) if time_match else None
+    direction, speed, gust, unit = wind
 
     # Parse datetime
-    parsed_datetime = None
+    date_str = iso_str = None
     if obs_time:
         day = int(obs_time[0:2])
         hour = int(obs_time[2:4])
         minute = int(obs_time[4:6])
 
         # Determine correct month/year
-        now = datetime.utcnow()
-        if day > now.day:
-            if now.month == 1:
-                year = now.year - 1
-                month = 12
-            else:
-                year = now.year
-                month = now.month - 1
-        else:
-            year = now.year
-            month = now.month
+        year, month = _resolve_year_month(day, now.day, now.month, now.year)
 
         try:
-            parsed_datetime = datetime(year, month, day, hour, minute)
+            datetime(year, month, day, hour, minute)  # Reject impossible dates
         except ValueError:
             pass
-
-    return {
-        'metar': metar_text.strip(),
-        'observation_time': obs_time,
-        'datetime': parsed_datetime.isoformat() if parsed_datetime else None,
-        'date': parsed_datetime.strftime('%Y-%m-%d') if parsed_datetime else None,
-        'wind_direction': direction,
-        'wind_speed': speed,
-        'wind_gust': gust,
-        'unit': unit,
-        'timestamp': datetime.utcnow().isoformat()
-    }
+        else:
+            date_str = f"{year:04d}-{month:02d}-{day:02d}"
+            iso_str = f"{date_str}T{hour:02d}:{minute:02d}:00"
+
+    return WindRecord(
+        metar=metar_text.strip(),
+        observation_time=obs_time,
+        datetime=iso_str,
+        date=date_str,
+        wind_direction=direction,
+        wind_speed=speed,
+        wind_gust=gust,
+        unit=unit,
+        timestamp=now_iso
+    )
 
 
 def convert_to_json(metars, output_file='la_gomera_wind_data.json'):
@@ -201,38 +334,45 @@ def convert_to_json(metars, output_file='la_gomera_wind_data.json'):
     print()
     print("Parsing wind data from METAR reports...")
 
-    wind_data = []
+    # One reference time for the whole batch
+    now = datetime.utcnow()
+    parse = partial(parse_wind_data, now=now, now_iso=now.isoformat())
+
+    # Each METAR parses independently, so spread large batches over all cores
+    if len(metars) >= PARALLEL_PARSE_MIN:
+        with Pool() as pool:
+            results = pool.map(parse, metars, chunksize=512)
+    else:
+        results = map(parse, metars)
 
-    for metar in metars:
-        parsed = parse_wind_data(metar)
-        if parsed:
-            wind_data.append(parsed)
+    wind_data = [r for r in results if r]
 
-    # Sort by datetime
-    wind_data.sort(key=lambda x: x['datetime'] if x['datetime'] else '')
+    # Sort by datetime (missing datetimes first); keys are extracted once
+    keys = [d.datetime or '' for d in wind_data]
+    wind_data[:] = [wind_data[i] for i in sorted(range(len(wind_data)), key=keys.__getitem__)]
 
     # Save to JSON
-    with open(output_file, 'w') as f:
-        json.dump(wind_data, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps([d._asdict() for d in wind_data], option=orjson.OPT_INDENT_2))
 
     print(f"✓ Parsed {len(wind_data)} observations with wind data")
     print(f"✓ Saved to {output_file}")
 
     # Display statistics
     if wind_data:
-        speeds = [d['wind_speed'] for d in wind_data]
-        gusts = [d['wind_gust'] for d in wind_data if d['wind_gust']]
+        speeds = np.fromiter((d.wind_speed for d in wind_data), dtype=np.int16, count=len(wind_data))
+        gusts = np.fromiter((d.wind_gust for d in wind_data if d.wind_gust), dtype=np.int16)
 
         print()
         print("Wind Data Summary:")
         print(f"  Total observations: {len(wind_data)}")
-        print(f"  First: {wind_data[0]['date']}")
-        print(f"  Last: {wind_data[-1]['date']}")
-        print(f"  Avg wind speed: {sum(speeds)/len(speeds):.1f} kt")
-        print(f"  Max wind speed: {max(speeds)} kt")
-        if gusts:
-            print(f"  Observations with gusts: {len(gusts)}")
-            print(f"  Max gust: {max(gusts)} kt")
+        print(f"  First: {wind_data[0].date}")
+        print(f"  Last: {wind_data[-1].date}")
+        print(f"  Avg wind speed: {speeds.mean():.1f} kt")
+        print(f"  Max wind speed: {speeds.max()} kt")
+        if gusts.size:
+            print(f"  Observations with gusts: {gusts.size}")
+            print(f"  Max gust: {gusts.max()} kt")
 
     return wind_data
 
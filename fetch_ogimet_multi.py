@@ -5,10 +5,44 @@ by making multiple requests and combining them
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import json
 from datetime import datetime, timedelta
 import re
+from typing import NamedTuple, Optional
+
+
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[429, 502, 503, 504],
+                      raise_on_status=False)
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+_METAR_RE = re.compile(
+    r'^(?:(?P<dt>\d{12})\s+)?'       # YYYYMMDDHHMM at start of line
+    r'(?:.*?\b(?P<obs>\d{6}Z)\b)?'   # DDHHmmZ observation time
+    r'.*?(?P<dir>\d{3}|VRB)(?P<spd>\d{2,3})(?:G(?P<gust>\d{2,3}))?(?P<unit>KT|MPS|KPH)'
+)
+_OGIMET_LINE_RE = re.compile(r'^\d{12}\s+METAR\s+GCGM')
+
+
+class WindRecord(NamedTuple):
+    """Parsed wind observation, fields in JSON key order"""
+    metar: str
+    observation_time: Optional[str]
+    datetime: Optional[str]
+    date: Optional[str]
+    wind_direction: str
+    wind_speed: int
+    wind_gust: Optional[int]
+    unit: str
+    timestamp: str
 
 
 def fetch_ogimet_day(station='GCGM'):
@@ -25,7 +59,7 @@ def fetch_ogimet_day(station='GCGM'):
     }
 
     try:
-        response = requests.get(url, params=params, timeout=15)
+        response = SESSION.get(url, params=params, timeout=15)
         if response.status_code == 200:
             return response.text
     except:
@@ -34,29 +68,32 @@ def fetch_ogimet_day(station='GCGM'):
     return None
 
 
-def parse_wind_data(metar_text):
-    """Parse wind information from METAR text"""
-    wind_pattern = r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS|KPH)'
-    match = re.search(wind_pattern, metar_text)
+def parse_wind_data(metar_text, now=None, now_iso=None):
+    """
+    Parse wind information from METAR text
+    """
+    if now is None:
+        now = datetime.utcnow()
+    if now_iso is None:
+        now_iso = now.isoformat()
+
+    # Timestamp prefix, DDHHmmZ and wind group in a single scan
+    match = _METAR_RE.search(metar_text)
 
     if not match:
         return None
 
-    direction = match.group(1)
-    speed = int(match.group(2))
-    gust = int(match.group(3)) if match.group(3) else None
-    unit = match.group(4)
-
-    # Extract date/time from the METAR
-    # Format: YYYYMMDDHHM M at start of line
-    datetime_pattern = r'^(\d{12})\s+'
-    datetime_match = re.search(datetime_pattern, metar_text)
+    direction = match.group('dir')
+    speed = int(match.group('spd'))
+    gust = int(match.group('gust')) if match.group('gust') else None
+    unit = match.group('unit')
 
     parsed_datetime = None
     obs_time = None
 
-    if datetime_match:
-        dt_str = datetime_match.group(1)
+    # Format: YYYYMMDDHHMM at start of line
+    dt_str = match.group('dt')
+    if dt_str:
         try:
             year = int(dt_str[0:4])
             month = int(dt_str[4:6])
@@ -71,16 +108,12 @@ def parse_wind_data(metar_text):
 
     # Fallback: extract from DDHHmmZ pattern
     if not parsed_datetime:
-        time_pattern = r'\b(\d{6}Z)\b'
-        time_match = re.search(time_pattern, metar_text)
+        obs_time = match.group('obs')
 
-        if time_match:
-            obs_time = time_match.group(1)
+        if obs_time:
             day = int(obs_time[0:2])
             hour = int(obs_time[2:4])
             minute = int(obs_time[4:6])
-
-            now = datetime.utcnow()
             if day > now.day:
                 month = now.month - 1 if now.month > 1 else 12
                 year = now.year if now.month > 1 else now.year - 1
@@ -96,34 +129,35 @@ def parse_wind_data(metar_text):
     if not parsed_datetime:
         return None
 
-    return {
-        'metar': metar_text.strip(),
-        'observation_time': obs_time,
-        'datetime': parsed_datetime.isoformat(),
-        'date': parsed_datetime.strftime('%Y-%m-%d'),
-        'wind_direction': direction,
-        'wind_speed': speed,
-        'wind_gust': gust,
-        'unit': unit,
-        'timestamp': datetime.utcnow().isoformat()
-    }
+    dt = parsed_datetime
+    date_str = f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+
+    return WindRecord(
+        metar=metar_text.strip(),
+        observation_time=obs_time,
+        datetime=f"{date_str}T{dt.hour:02d}:{dt.minute:02d}:00",
+        date=date_str,
+        wind_direction=direction,
+        wind_speed=speed,
+        wind_gust=gust,
+        unit=unit,
+        timestamp=now_iso
+    )
 
 
 def extract_metars(text):
     """Extract METAR reports from OGIMET response"""
     metars = []
 
-    lines = text.split('\n')
-
-    for line in lines:
-        line = line.strip()
-
-        # Skip comments, headers, and empty lines
-        if not line or line.startswith('#') or '<' in line:
+    for line in text.splitlines():
+        # Cheap substring test first; comments, headers and blank lines
+        # never mention the station
+        if 'GCGM' not in line:
             continue
 
         # Line starts with timestamp and contains GCGM
-        if re.match(r'^\d{12}\s+METAR\s+GCGM', line):
+        line = line.strip()
+        if _OGIMET_LINE_RE.match(line):
             metars.append(line)
 
     return metars
@@ -169,8 +203,10 @@ def main():
 
     # Parse wind data
     wind_data = []
+    now = datetime.utcnow()
+    now_iso = now.isoformat()
     for metar in metars:
-        parsed = parse_wind_data(metar)
+        parsed = parse_wind_data(metar, now=now, now_iso=now_iso)
         if parsed:
             wind_data.append(parsed)
 
@@ -179,22 +215,22 @@ def main():
 
     if wind_data:
         # Sort by datetime
-        wind_data.sort(key=lambda x: x['datetime'])
+        wind_data.sort(key=lambda x: x.datetime)
 
         # Save
         output_file = 'ogimet_wind_data.json'
         with open(output_file, 'w') as f:
-            json.dump(wind_data, f, indent=2)
+            json.dump([d._asdict() for d in wind_data], f, indent=2)
 
         print(f"✓ Saved to {output_file}")
         print()
 
         # Stats
-        speeds = [d['wind_speed'] for d in wind_data]
-        gusts = [d['wind_gust'] for d in wind_data if d['wind_gust']]
+        speeds = [d.wind_speed for d in wind_data]
+        gusts = [d.wind_gust for d in wind_data if d.wind_gust]
 
         print("Wind Data Summary:")
-        print(f"  Date range: {wind_data[0]['date']} to {wind_data[-1]['date']}")
+        print(f"  Date range: {wind_data[0].date} to {wind_data[-1].date}")
         print(f"  Total observations: {len(wind_data)}")
         print(f"  Avg wind speed: {sum(speeds)/len(speeds):.1f} kt")
         print(f"  Max wind speed: {max(speeds)} kt")
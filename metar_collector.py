@@ -13,13 +13,17 @@ Supported airports:
 
 import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
 import sys
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import time
 import re
 from pathlib import Path
+from typing import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 
 
 # Configuration
@@ -27,6 +31,13 @@ STATIONS = ['GCGM', 'GCLA', 'KROW', 'GMMX', 'GMMD']  # La Gomera, La Palma, Rosw
 DB_PATH = 'metar_data.db'
 HOURS_TO_FETCH = 48  # Fetch last 48 hours with overlap to ensure no gaps
 LOG_LEVEL = logging.INFO
+MAX_FETCH_ATTEMPTS = 3
+MAX_RETRY_DELAY = 60  # Seconds; longer Retry-After values give up instead
+
+# Wind: direction(3 digits or VRB) + speed + optional gust + unit
+_WIND_RE = re.compile(r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS)')
+# Time: DDHHmmZ
+_TIME_RE = re.compile(r'\b(\d{6}Z)\b')
 
 
 # Setup logging
@@ -40,6 +51,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=len(STATIONS))
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+
+class Obs(NamedTuple):
+    """Parsed observation, fields in metar_observations column order"""
+    station: str
+    observation_time: str
+    datetime: str
+    date: str
+    wind_direction: str
+    wind_speed: int
+    wind_gust: Optional[int]
+    unit: str
+    metar_text: str
+    fetched_at: str
+
 
 class METARCollector:
     def __init__(self, api_key, station, db_path=DB_PATH):
@@ -49,17 +79,49 @@ class METARCollector:
         self.base_url = "https://api.checkwx.com/metar"
         self.headers = {'X-API-Key': api_key}
 
+        # One connection for the collector's lifetime, so SQLite keeps its
+        # schema and prepared-statement caches between calls
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.row_factory = sqlite3.Row
+        # WAL only needs fsync at checkpoints, so NORMAL is still safe
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA cache_size=-8192")
+
         # Initialize database
         self._init_database()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the database connection"""
+        self._conn.close()
+
     def _init_database(self):
         """Initialize SQLite database with schema"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
+        # Persists in the database file
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        # Databases created before the WITHOUT ROWID schema still have the
+        # id column; rebuild them in one transaction
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(metar_observations)")]
+        legacy = 'id' in columns
+
+        cursor.execute("BEGIN")
+        if legacy:
+            logger.info("Migrating metar_observations to the WITHOUT ROWID schema")
+            cursor.execute("ALTER TABLE metar_observations RENAME TO metar_observations_legacy")
+
+        # The natural key is the primary key: one B-tree per row, no
+        # rowid, sqlite_sequence or separate UNIQUE index to maintain
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS metar_observations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
                 station TEXT NOT NULL,
                 observation_time TEXT NOT NULL,
                 datetime TEXT NOT NULL,
@@ -70,23 +132,32 @@ class METARCollector:
                 unit TEXT,
                 metar_text TEXT NOT NULL,
                 fetched_at TEXT NOT NULL,
-                UNIQUE(station, observation_time, datetime)
-            )
+                PRIMARY KEY (station, observation_time, datetime)
+            ) WITHOUT ROWID
         ''')
 
+        if legacy:
+            cursor.execute('''
+                INSERT OR IGNORE INTO metar_observations
+                SELECT station, observation_time, datetime, date, wind_direction,
+                       wind_speed, wind_gust, unit, metar_text, fetched_at
+                FROM metar_observations_legacy
+            ''')
+            cursor.execute("DROP TABLE metar_observations_legacy")
+
         # Create indexes for faster queries
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_station_date
             ON metar_observations(station, date)
         ''')
 
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_datetime
-            ON metar_observations(datetime)
-        ''')
+        # idx_datetime cost a B-tree write per insert for queries that are
+        # always station-scoped, and older export_data.py runs added
+        # idx_station_datetime; drop both from databases that still have them
+        cursor.execute("DROP INDEX IF EXISTS idx_datetime")
+        cursor.execute("DROP INDEX IF EXISTS idx_station_datetime")
 
-        conn.commit()
-        conn.close()
+        self._conn.commit()
         logger.info(f"Database initialized at {self.db_path}")
 
     def fetch_metar_data(self, hours_back=HOURS_TO_FETCH):
@@ -98,7 +169,7 @@ class METARCollector:
         logger.info(f"Fetching current METAR data for {self.station}")
 
         try:
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = self._get_with_retries(url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -127,18 +198,48 @@ class METARCollector:
             logger.error(f"Error fetching METAR data: {str(e)}")
             return None
 
-    def parse_metar(self, metar_text):
-        """Parse METAR text and extract wind data"""
+    def _get_with_retries(self, url):
+        """GET with exponential back-off on timeouts, 429 and 503 (honouring Retry-After)"""
+        for attempt in range(MAX_FETCH_ATTEMPTS):
+            last_attempt = attempt == MAX_FETCH_ATTEMPTS - 1
+
+            try:
+                response = SESSION.get(url, headers=self.headers, timeout=30)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                if last_attempt:
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Request failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in (429, 503) or last_attempt:
+                return response
+
+            retry_after = response.headers.get('Retry-After', '')
+            delay = int(retry_after) if retry_after.isdigit() else 2 ** attempt
+            if delay > MAX_RETRY_DELAY:
+                return response
+
+            logger.warning(f"HTTP {response.status_code}, retrying in {delay}s")
+            time.sleep(delay)
+
+    def parse_metar(self, metar_text, now=None, now_iso=None):
+        """
+        Parse METAR text and extract wind data
+
+        process_metars shares one `now`/`now_iso` (naive UTC) per batch.
+        """
         if not metar_text:
             return None
 
-        # Wind pattern: direction(3 digits or VRB) + speed + optional gust + unit
-        wind_pattern = r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS)'
-        wind_match = re.search(wind_pattern, metar_text)
+        if now is None:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if now_iso is None:
+            now_iso = now.isoformat()
 
-        # Time pattern: DDHHmmZ
-        time_pattern = r'\b(\d{6}Z)\b'
-        time_match = re.search(time_pattern, metar_text)
+        wind_match = _WIND_RE.search(metar_text)
+        time_match = _TIME_RE.search(metar_text)
 
         if not wind_match or not time_match:
             logger.debug(f"Could not parse METAR: {metar_text}")
@@ -151,48 +252,49 @@ class METARCollector:
         obs_time = time_match.group(1)
 
         # Parse datetime from observation time
-        parsed_datetime = self._parse_obs_datetime(obs_time)
+        parsed_datetime = self._parse_obs_datetime(obs_time, now)
         if not parsed_datetime:
             logger.debug(f"Could not parse datetime from: {obs_time}")
             return None
 
-        return {
-            'station': self.station,
-            'observation_time': obs_time,
-            'datetime': parsed_datetime.isoformat(),
-            'date': parsed_datetime.strftime('%Y-%m-%d'),
-            'wind_direction': direction,
-            'wind_speed': speed,
-            'wind_gust': gust,
-            'unit': unit,
-            'metar_text': metar_text.strip(),
-            'fetched_at': datetime.utcnow().isoformat()
-        }
-
-    def _parse_obs_datetime(self, obs_time):
-        """Parse observation time (DDHHmmZ) to datetime"""
-        try:
-            day = int(obs_time[0:2])
-            hour = int(obs_time[2:4])
-            minute = int(obs_time[4:6])
-
-            now = datetime.utcnow()
-
-            # Handle month rollover
-            if day > now.day:
-                if now.month > 1:
-                    month = now.month - 1
-                    year = now.year
-                else:
-                    month = 12
-                    year = now.year - 1
-            else:
-                month = now.month
+        return Obs(
+            station=self.station,
+            observation_time=obs_time,
+            datetime=parsed_datetime.isoformat(),
+            date=parsed_datetime.strftime('%Y-%m-%d'),
+            wind_direction=direction,
+            wind_speed=speed,
+            wind_gust=gust,
+            unit=unit,
+            metar_text=metar_text.strip(),
+            fetched_at=now_iso
+        )
+
+    def _parse_obs_datetime(self, obs_time, now=None):
+        """Parse observation time (DDHHmmZ, as matched by _TIME_RE) to datetime"""
+        if now is None:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        # _TIME_RE already guarantees six ASCII digits, so decode them directly
+        day = (ord(obs_time[0]) - 48) * 10 + ord(obs_time[1]) - 48
+        hour = (ord(obs_time[2]) - 48) * 10 + ord(obs_time[3]) - 48
+        minute = (ord(obs_time[4]) - 48) * 10 + ord(obs_time[5]) - 48
+
+        # Handle month rollover
+        if day > now.day:
+            if now.month > 1:
+                month = now.month - 1
                 year = now.year
+            else:
+                month = 12
+                year = now.year - 1
+        else:
+            month = now.month
+            year = now.year
 
+        try:
             return datetime(year, month, day, hour, minute)
-
-        except (ValueError, IndexError) as e:
+        except ValueError as e:
             logger.debug(f"Error parsing observation time {obs_time}: {e}")
             return None
 
@@ -202,47 +304,48 @@ class METARCollector:
             logger.info("No observations to store")
             return 0
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
-        new_count = 0
-        duplicate_count = 0
+        # One transaction and one prepared statement for the whole batch
+        cursor.execute("BEGIN IMMEDIATE")
 
-        for obs in observations:
-            try:
-                cursor.execute('''
-                    INSERT INTO metar_observations
-                    (station, observation_time, datetime, date, wind_direction,
-                     wind_speed, wind_gust, unit, metar_text, fetched_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    obs['station'],
-                    obs['observation_time'],
-                    obs['datetime'],
-                    obs['date'],
-                    obs['wind_direction'],
-                    obs['wind_speed'],
-                    obs['wind_gust'],
-                    obs['unit'],
-                    obs['metar_text'],
-                    obs['fetched_at']
-                ))
-                new_count += 1
-
-            except sqlite3.IntegrityError:
-                # Duplicate - already exists
-                duplicate_count += 1
-
-        conn.commit()
-        conn.close()
+        # Don't leave the persistent connection inside a failed write
+        # transaction, holding the lock for the next call
+        try:
+            # Most of a 48h window is already stored, so drop known keys with a
+            # set lookup first; INSERT OR IGNORE still covers anything left
+            cursor.execute('''
+                SELECT observation_time, datetime
+                FROM metar_observations
+                WHERE station = ? AND date >= ?
+            ''', (self.station, min(obs.date for obs in observations)))
+            existing = set(map(tuple, cursor.fetchall()))
+            # Obs is already a tuple in column order, so it binds as-is
+            rows = [obs for obs in observations
+                    if (obs.observation_time, obs.datetime) not in existing]
+
+            changes_before = self._conn.total_changes
+            cursor.executemany('''
+                INSERT OR IGNORE INTO metar_observations
+                (station, observation_time, datetime, date, wind_direction,
+                 wind_speed, wind_gust, unit, metar_text, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+            new_count = self._conn.total_changes - changes_before
+            duplicate_count = len(observations) - new_count
+
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
 
         logger.info(f"Stored {new_count} new observations, {duplicate_count} duplicates skipped")
         return new_count
 
     def get_database_stats(self):
         """Get statistics about stored data"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
 
         cursor.execute('SELECT COUNT(*) FROM metar_observations WHERE station = ?', (self.station,))
         total_count = cursor.fetchone()[0]
@@ -254,8 +357,6 @@ class METARCollector:
         ''', (self.station,))
         date_range = cursor.fetchone()
 
-        conn.close()
-
         return {
             'total_observations': total_count,
             'earliest_date': date_range[0],
@@ -269,6 +370,10 @@ class METARCollector:
         # Fetch data
         metars = self.fetch_metar_data()
 
+        return self.process_metars(metars)
+
+    def process_metars(self, metars):
+        """Parse and store METARs returned by fetch_metar_data"""
         if metars is None:
             logger.error("Failed to fetch METAR data")
             return False
@@ -277,10 +382,12 @@ class METARCollector:
             logger.warning("No METAR data available")
             return True
 
-        # Parse observations
+        # Parse observations against one reference time
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        now_iso = now.isoformat()
         observations = []
         for metar_text in metars:
-            obs = self.parse_metar(metar_text)
+            obs = self.parse_metar(metar_text, now=now, now_iso=now_iso)
             if obs:
                 observations.append(obs)
 
@@ -315,13 +422,23 @@ def main():
         print("Get your free API key at: https://www.checkwx.com/")
         sys.exit(1)
 
-    # Run collector for all configured stations
     all_success = True
-    for station in STATIONS:
-        collector = METARCollector(api_key, station)
-        success = collector.run()
-        if not success:
-            all_success = False
+    # Run collector for all configured stations; the stack closes every
+    # connection opened so far if a constructor or fetch raises
+    with ExitStack() as stack:
+        collectors = []
+        for station in STATIONS:
+            logger.info(f"Starting METAR collection for {station}")
+            collectors.append(stack.enter_context(METARCollector(api_key, station)))
+
+        # The API round-trips are independent, so overlap them; parsing and
+        # database writes stay sequential
+        with ThreadPoolExecutor(max_workers=len(collectors)) as executor:
+            fetched = list(executor.map(lambda c: c.fetch_metar_data(), collectors))
+
+        for collector, metars in zip(collectors, fetched):
+            if not collector.process_metars(metars):
+                all_success = False
 
     sys.exit(0 if all_success else 1)
 
@@ -5,46 +5,81 @@ Converts raw METAR text to our visualization format
 """
 
 import re
-import json
-from datetime import datetime
+import orjson
+from datetime import datetime, timezone
 import sys
-
-
-def parse_wind_data(metar_text):
+from functools import lru_cache
+
+
+# Full date (YYYY/MM/DD HH:MM, some formats include it), wind group
+# (dddssGggKT or dddssKT), observation time (DDHHmmZ) and a bare year,
+# found in one left-to-right scan
+_METAR_RE = re.compile(
+    r'(?P<full_date>(?P<fy>\d{4})/(?P<fmo>\d{2})/(?P<fd>\d{2})\s+(?P<fh>\d{2}):(?P<fmi>\d{2}))'
+    r'|(?P<wind>(?P<dir>\d{3}|VRB)(?P<speed>\d{2,3})(?:G(?P<gust>\d{2,3}))?(?P<unit>KT|MPS|KPH))'
+    r'|(?P<time>\b\d{6}Z\b)'
+    r'|(?P<year>\b20\d{2}\b)'
+)
+_DDHHMMZ_RE = re.compile(r'\d{6}Z')
+# Dedup key: full-date prefix if present (YYYYMMDDHHMM or YYYY/MM/DD HH:MM),
+# station and observation time (CCCC DDHHmmZ)
+_KEY_RE = re.compile(
+    r'^(\d{12}|\d{4}/\d{2}/\d{2}\s+\d{2}:\d{2})?.*?\b([A-Z]{4})\s+(\d{6}Z)\b'
+)
+_MONTH_RE = re.compile(r'\b(0[1-9]|1[0-2])\b')
+
+
+@lru_cache(maxsize=64)
+def _resolve_year_month(day, now_day, now_month, now_year):
+    """Year and month of a DDHHmmZ day: the previous month if it's ahead of today"""
+    if day > now_day:
+        if now_month == 1:
+            return now_year - 1, 12
+        return now_year, now_month - 1
+    return now_year, now_month
+
+
+def parse_wind_data(metar_text, now=None, now_iso=None):
     """
     Parse wind information from METAR text
+
+    `now`/`now_iso` (naive UTC) default to the current time.
     """
-    # Wind pattern: dddssGggKT or dddssKT
-    wind_pattern = r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS|KPH)'
+    if now is None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if now_iso is None:
+        now_iso = now.isoformat()
 
-    match = re.search(wind_pattern, metar_text)
+    # First match of each kind, keyed by its outer group name
+    found = {}
+    for m in _METAR_RE.finditer(metar_text):
+        found.setdefault(m.lastgroup, m)
+
+    match = found.get('wind')
     if not match:
         return None
 
-    direction = match.group(1)
-    speed = int(match.group(2))
-    gust = int(match.group(3)) if match.group(3) else None
-    unit = match.group(4)
+    direction = match.group('dir')
+    speed = int(match.group('speed'))
+    gust = int(match.group('gust')) if match.group('gust') else None
+    unit = match.group('unit')
 
     # Extract observation time (DDHHmmZ)
-    time_pattern = r'\b(\d{6}Z)\b'
-    time_match = re.search(time_pattern, metar_text)
-    obs_time = time_match.group(1) if time_match else None
+    time_match = found.get('time')
+    obs_time = time_match.group('time') if time_match else None
 
     # Extract year-month if present in METAR
-    # Some formats include full date: YYYY/MM/DD HH:MM
-    full_date_pattern = r'(\d{4})/(\d{2})/(\d{2})\s+(\d{2}):(\d{2})'
-    full_date_match = re.search(full_date_pattern, metar_text)
+    full_date_match = found.get('full_date')
 
     parsed_datetime = None
 
     if full_date_match:
         # Full date format found
-        year = int(full_date_match.group(1))
-        month = int(full_date_match.group(2))
-        day = int(full_date_match.group(3))
-        hour = int(full_date_match.group(4))
-        minute = int(full_date_match.group(5))
+        year = int(full_date_match.group('fy'))
+        month = int(full_date_match.group('fmo'))
+        day = int(full_date_match.group('fd'))
+        hour = int(full_date_match.group('fh'))
+        minute = int(full_date_match.group('fmi'))
 
         try:
             parsed_datetime = datetime(year, month, day, hour, minute)
@@ -58,30 +93,19 @@ def parse_wind_data(metar_text):
         minute = int(obs_time[4:6])
 
         # Try to infer year/month from context or use current
-        now = datetime.utcnow()
-
         # Look for year in the METAR text
-        year_match = re.search(r'\b(20\d{2})\b', metar_text)
+        year_match = found.get('year')
         if year_match:
-            year = int(year_match.group(1))
+            year = int(year_match.group('year'))
             # Try to find month
-            month_match = re.search(r'\b(0[1-9]|1[0-2])\b', metar_text)
+            month_match = _MONTH_RE.search(metar_text)
             if month_match:
                 month = int(month_match.group(1))
             else:
                 month = now.month
         else:
             # Default to current year/month with adjustment for day
-            if day > now.day:
-                if now.month == 1:
-                    year = now.year - 1
-                    month = 12
-                else:
-                    year = now.year
-                    month = now.month - 1
-            else:
-                year = now.year
-                month = now.month
+            year, month = _resolve_year_month(day, now.day, now.month, now.year)
 
         try:
             parsed_datetime = datetime(year, month, day, hour, minute)
@@ -97,21 +121,19 @@ def parse_wind_data(metar_text):
         'wind_speed': speed,
         'wind_gust': gust,
         'unit': unit,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': now_iso
     }
 
 
-def extract_metars_from_text(text):
+def extract_metars_from_lines(lines):
     """
-    Extract METAR reports from raw text file
+    Extract METAR reports from an iterable of raw text lines (e.g. an open file)
     Handles various OGIMET formats
     """
     metars = []
 
-    # Split by lines first
-    lines = text.split('\n')
-
     current_metar = []
+    current_has_gcgm = False  # Saves re-joining current_metar to test for GCGM
 
     for line in lines:
         line = line.strip()
@@ -120,47 +142,49 @@ def extract_metars_from_text(text):
         if not line or line.startswith('===') or line.startswith('---'):
             continue
 
-        # Skip HTML tags
-        if '<' in line and '>' in line:
+        # Skip HTML tags (METAR bodies never contain '<')
+        if '<' in line:
             continue
 
-        # Check if line contains GCGM and a date pattern
-        if 'GCGM' in line or 'METAR' in line or re.search(r'\d{6}Z', line):
+        # Check if line contains GCGM and a date pattern; the 'Z' test
+        # skips the regex on most lines
+        if 'GCGM' in line or 'METAR' in line or ('Z' in line and _DDHHMMZ_RE.search(line)):
             # If we have accumulated a METAR, save it
-            if current_metar and 'GCGM' in ' '.join(current_metar):
+            if current_metar and current_has_gcgm:
                 metar_text = ' '.join(current_metar)
                 metars.append(metar_text)
                 current_metar = []
+                current_has_gcgm = False
 
             current_metar.append(line)
+            current_has_gcgm = current_has_gcgm or 'GCGM' in line
         elif current_metar:
             # Continue accumulating lines for current METAR
             current_metar.append(line)
+            current_has_gcgm = current_has_gcgm or 'GCGM' in line
 
     # Don't forget the last METAR
-    if current_metar and 'GCGM' in ' '.join(current_metar):
+    if current_metar and current_has_gcgm:
         metar_text = ' '.join(current_metar)
         metars.append(metar_text)
 
-    # Clean up METARs
-    cleaned_metars = []
-    for metar in metars:
-        # Remove multiple spaces
-        metar = ' '.join(metar.split())
+    # Collapse whitespace; must contain both GCGM and a time pattern
+    cleaned = (
+        ' '.join(metar.split()) for metar in metars
+        if 'GCGM' in metar and _DDHHMMZ_RE.search(metar)
+    )
 
-        # Must contain both GCGM and a time pattern
-        if 'GCGM' in metar and re.search(r'\d{6}Z', metar):
-            cleaned_metars.append(metar)
+    # Remove duplicates while preserving order. Reports are keyed on
+    # date prefix + station + time, so copies differing only in remarks
+    # collapse to the first one seen, while the same DDHHmmZ in another
+    # month of a multi-month dump is kept
+    unique_metars = {}
+    for metar in cleaned:
+        key_match = _KEY_RE.search(metar)
+        key = key_match.groups() if key_match else metar
+        unique_metars.setdefault(key, metar)
 
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_metars = []
-    for metar in cleaned_metars:
-        if metar not in seen:
-            seen.add(metar)
-            unique_metars.append(metar)
-
-    return unique_metars
+    return list(unique_metars.values())
 
 
 def process_metar_file(input_file, output_file='la_gomera_wind_data.json'):
@@ -174,14 +198,15 @@ def process_metar_file(input_file, output_file='la_gomera_wind_data.json'):
     print()
 
     try:
-        with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
-            text = f.read()
+        f = open(input_file, 'r', encoding='utf-8', errors='ignore')
     except Exception as e:
         print(f"✗ Error reading file: {e}")
         return
 
+    # Stream the file line by line rather than reading it whole
     print("Extracting METAR reports from file...")
-    metars = extract_metars_from_text(text)
+    with f:
+        metars = extract_metars_from_lines(f)
 
     print(f"✓ Found {len(metars)} METAR reports")
     print()
@@ -202,9 +227,11 @@ def process_metar_file(input_file, output_file='la_gomera_wind_data.json'):
 
     print("Parsing wind data...")
     wind_data = []
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    now_iso = now.isoformat()
 
     for metar in metars:
-        parsed = parse_wind_data(metar)
+        parsed = parse_wind_data(metar, now=now, now_iso=now_iso)
         if parsed:
             wind_data.append(parsed)
 
@@ -219,26 +246,44 @@ def process_metar_file(input_file, output_file='la_gomera_wind_data.json'):
     wind_data.sort(key=lambda x: x.get('datetime', '') if x.get('datetime') else 'zzz')
 
     # Save to JSON
-    with open(output_file, 'w') as f:
-        json.dump(wind_data, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(wind_data, option=orjson.OPT_INDENT_2))
 
     print(f"✓ Saved to {output_file}")
     print()
 
-    # Display statistics
-    speeds = [d['wind_speed'] for d in wind_data]
-    gusts = [d['wind_gust'] for d in wind_data if d['wind_gust']]
-
-    dates_with_data = [d['date'] for d in wind_data if d.get('date')]
-    if dates_with_data:
+    # Display statistics, accumulated in a single pass
+    speed_sum = speed_max = 0
+    gust_count = gust_max = 0
+    first_date = last_date = None
+    for d in wind_data:
+        speed = d['wind_speed']
+        speed_sum += speed
+        if speed > speed_max:
+            speed_max = speed
+
+        gust = d['wind_gust']
+        if gust:
+            gust_count += 1
+            if gust > gust_max:
+                gust_max = gust
+
+        date = d['date']
+        if date:
+            if first_date is None or date < first_date:
+                first_date = date
+            if last_date is None or date > last_date:
+                last_date = date
+
+    if first_date:
         print("Wind Data Summary:")
         print(f"  Total observations: {len(wind_data)}")
-        print(f"  Date range: {min(dates_with_data)} to {max(dates_with_data)}")
-        print(f"  Avg wind speed: {sum(speeds)/len(speeds):.1f} kt")
-        print(f"  Max wind speed: {max(speeds)} kt")
-        if gusts:
-            print(f"  Observations with gusts: {len(gusts)} ({len(gusts)/len(wind_data)*100:.1f}%)")
-            print(f"  Max gust: {max(gusts)} kt")
+        print(f"  Date range: {first_date} to {last_date}")
+        print(f"  Avg wind speed: {speed_sum/len(wind_data):.1f} kt")
+        print(f"  Max wind speed: {speed_max} kt")
+        if gust_count:
+            print(f"  Observations with gusts: {gust_count} ({gust_count/len(wind_data)*100:.1f}%)")
+            print(f"  Max gust: {gust_max} kt")
 
     print()
     print("=" * 70)